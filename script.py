@@ -12,13 +12,21 @@ SECURE USAGE:
 This script intentionally has no hard-coded tokens.
 """
 import os
+import re
 import sys
+import threading
 import time
+import json
 import logging
 import html
-from typing import Optional, Dict, Any, List, Tuple
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Tuple
+import orjson
+
+if TYPE_CHECKING:
+    import requests
 
 # --- Config ---
 GRAPHQL_URL = "https://leetcode.com/graphql"
@@ -37,10 +45,63 @@ query {
   }
 }
 """
+# The request body never changes, so encode it once at import time.
+_QUERY_BODY = orjson.dumps({"query": QUERY})
 
-RETRY_ATTEMPTS = 2
-RETRY_DELAY = 2  # seconds
+RETRY_ATTEMPTS = 4
+RETRY_DELAY = float(os.environ.get("LEETCODE_RETRY_DELAY", "0.5"))  # exponential backoff factor, seconds
 REQUEST_TIMEOUT = 10  # seconds
+SEND_WORKERS = 8  # max concurrent Telegram sends
+MAX_RESPONSE_BYTES = 256 * 1024  # cap on the (decoded) GraphQL response body
+
+# On-disk cache of the parsed daily challenge, keyed by UTC date.
+CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "leetcode-daily.json",
+)
+CACHE_TTL = int(os.environ.get("LEETCODE_CACHE_TTL", "86400"))  # seconds
+NO_CACHE = os.environ.get("LEETCODE_NOCACHE", "") not in ("", "0")
+
+# Shared session for all outbound HTTPS (LeetCode fetch + Telegram sends) so
+# TLS handshakes are amortized over keep-alive connections. Transient failures
+# are retried with exponential backoff, honouring Retry-After; on exhaustion the
+# last response is returned rather than raised.
+#
+# sendMessage is not idempotent: after a read error or 5xx Telegram may already
+# have delivered the message, so api.telegram.org gets its own adapter that only
+# retries connect errors and 429. The read-only GraphQL query keeps the broader
+# policy (connection/read errors, 429, 5xx).
+#
+# requests (and urllib3) are imported on first use rather than at module load,
+# so runs that exit early never import them.
+@lru_cache(maxsize=None)
+def get_session() -> "requests.Session":
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=RETRY_ATTEMPTS,
+        backoff_factor=RETRY_DELAY,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset(["GET", "HEAD", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    telegram_retry = Retry(
+        total=RETRY_ATTEMPTS,
+        read=0,
+        backoff_factor=RETRY_DELAY,
+        status_forcelist=[429],
+        allowed_methods=frozenset(["HEAD", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    session.headers.update({"User-Agent": "Mozilla/5.0 (compatible; leetcode-daily-bot/1.0)"})
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+    session.mount("https://api.telegram.org/", HTTPAdapter(pool_maxsize=16, max_retries=telegram_retry))
+    return session
 
 # ---------------------------
 # Recipients: load from env (no fallback tokens here)
@@ -95,25 +156,66 @@ if not RECIPIENTS:
         "to a comma-separated list of BOT_TOKEN:CHAT_ID entries (store it as a GitHub Actions secret)."
     )
 
+# Only the first few KB of a problem statement are scanned (KaTeX/SVG can make
+# it 20 KB+). Markup-heavy statements may yield fewer than SNIPPET_CHARS of text
+# from that slice; the snippet is then marked as truncated all the same.
+MAX_HTML_CHARS = 4096
+SNIPPET_CHARS = 700
+
+# Drop <script>/<style> blocks with their contents, any other tag on its own.
+# A block left unterminated by the MAX_HTML_CHARS cut is dropped to the end.
+_STRIP_RE = re.compile(r"<(script|style)\b[^>]*>.*?(?:</\1\s*>|\Z)|<[^>]+>", re.S | re.I)
+# Keep exponents readable once tags are gone: 10<sup>5</sup> -> 10^5
+_SUP_RE = re.compile(r"<sup\b[^>]*>", re.I)
+_WS_RE = re.compile(r"\s+")
+
 def clean_html(html_content: str) -> str:
     """Convert HTML to plain text, escape unsafe chars, and limit length."""
-    soup = BeautifulSoup(html_content or "", "html.parser")
-    text = soup.get_text(" ", strip=True)
+    html_content = html_content or ""
+    sliced = len(html_content) > MAX_HTML_CHARS
+    if sliced:
+        html_content = html_content[:MAX_HTML_CHARS]
+        # Drop a tag cut off mid-way so it doesn't leak into the text
+        cut = html_content.rfind("<")
+        if cut > html_content.rfind(">"):
+            html_content = html_content[:cut]
+    # Strip tags before unescaping so entities like &lt; are not mistaken for markup
+    text = _STRIP_RE.sub(" ", _SUP_RE.sub("^", html_content))
+    text = _WS_RE.sub(" ", html.unescape(text)).strip()
     text = html.escape(text)  # escape <, >, & so Telegram won't misinterpret
-    return text[:700] + "..." if len(text) > 700 else text
+    return text[:SNIPPET_CHARS] + "..." if sliced or len(text) > SNIPPET_CHARS else text
 
-def send_telegram_single(bot_token: str, chat_id: str, text: str) -> Dict[str, Any]:
-    """Send message via Telegram Bot API for a single bot/chat pair. Returns JSON response."""
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+def encode_message_payload(text: str) -> bytes:
+    """
+    Serialize the sendMessage body once, without chat_id and without the closing
+    brace, so send_telegram_single only has to append the chat_id per recipient.
+    """
     payload = {
-        "chat_id": chat_id,
         "text": text,
         "parse_mode": "HTML",  # safe because we escape snippet
         "disable_web_page_preview": False,
     }
+    return orjson.dumps(payload)[:-1]
+
+def send_telegram_single(
+    bot_token: str, chat_id: str, payload_prefix: bytes, session: Optional["requests.Session"] = None
+) -> Dict[str, Any]:
+    """
+    Send message via Telegram Bot API for a single bot/chat pair. Returns JSON response.
+
+    payload_prefix is the pre-encoded body from encode_message_payload().
+    """
+    session = session or get_session()
+    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    body = payload_prefix + b',"chat_id":' + orjson.dumps(chat_id) + b"}"
     try:
-        resp = requests.post(url, json=payload, timeout=REQUEST_TIMEOUT)
-        j = resp.json()
+        resp = session.post(
+            url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            timeout=REQUEST_TIMEOUT,
+        )
+        j = orjson.loads(resp.content)
     except Exception as e:
         logging.exception(
             "Failed to send Telegram message to chat_id=%s (bot_token head=%s): %s",
@@ -124,60 +226,170 @@ def send_telegram_single(bot_token: str, chat_id: str, text: str) -> Dict[str, A
         return {"ok": False, "error": str(e)}
     return j
 
-def fetch_daily(session: Optional[requests.Session] = None) -> Dict[str, Any]:
-    """Fetch today's LeetCode daily challenge."""
-    session = session or requests.Session()
-    session.headers.update({"User-Agent": "Mozilla/5.0 (compatible; leetcode-daily-bot/1.0)"})
+def send_telegram_many(
+    bot_token: str, chat_ids: List[str], payload_prefix: bytes, session: Optional["requests.Session"] = None
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """Send to each chat of one bot in order, over the same connection. Returns (chat_id, response) pairs."""
+    return [(chat_id, send_telegram_single(bot_token, chat_id, payload_prefix, session)) for chat_id in chat_ids]
+
+def _utc_today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
-    # Initial GET to obtain cookies / csrftoken
+def load_cached_daily() -> Optional[Dict[str, Any]]:
+    """Return the cached daily challenge if it is for today's UTC date and within CACHE_TTL."""
     try:
-        _ = session.get("https://leetcode.com", timeout=REQUEST_TIMEOUT)
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning("Ignoring unreadable cache file %s: %s", CACHE_PATH, e)
+        return None
+
+    today = stored.get("daily") if isinstance(stored, dict) else None
+    if not today or today.get("date") != _utc_today():
+        return None
+    if time.time() - stored.get("fetched_at", 0) > CACHE_TTL:
+        return None
+    return today
+
+def store_cached_daily(today: Dict[str, Any]) -> None:
+    """Atomically write the daily challenge to CACHE_PATH (tmp file + os.replace)."""
+    tmp_path = CACHE_PATH + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "daily": today}, f)
+        os.replace(tmp_path, CACHE_PATH)
+    except Exception as e:
+        logging.warning("Failed to write cache file %s: %s", CACHE_PATH, e)
+
+def _fetch_csrftoken(session: "requests.Session") -> str:
+    """GET leetcode.com to obtain cookies and return the csrftoken ("" if unavailable)."""
+    # The body is read in full (no stream=True) so the connection goes back to
+    # the pool for the retried POST; redirects aren't needed to get the cookie.
+    try:
+        _ = session.get("https://leetcode.com", timeout=REQUEST_TIMEOUT, allow_redirects=False)
     except Exception as e:
         logging.warning("Initial GET to leetcode.com failed: %s", e)
+    return session.cookies.get("csrftoken", "")
+
+def _read_capped(resp: "requests.Response") -> bytes:
+    """
+    Read a streamed response body, raising RuntimeError once it exceeds
+    MAX_RESPONSE_BYTES so oversized payloads are never buffered in full.
+    A fully consumed body lets close() hand the connection back to the pool
+    instead of dropping it.
+    """
+    chunks = []
+    size = 0
+    with resp:
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > MAX_RESPONSE_BYTES:
+                raise RuntimeError(f"Response exceeds {MAX_RESPONSE_BYTES} bytes")
+            chunks.append(chunk)
+    return b"".join(chunks)
 
-    csrftoken = session.cookies.get("csrftoken", "")
+def fetch_daily(session: Optional["requests.Session"] = None, use_cache: bool = True) -> Dict[str, Any]:
+    """Fetch today's LeetCode daily challenge (served from the on-disk cache when fresh)."""
+    if use_cache:
+        cached = load_cached_daily()
+        if cached:
+            logging.info("Using cached daily challenge for %s.", cached.get("date"))
+            return cached
+
+    session = session or get_session()
+
+    # The daily-challenge query is public, so skip the csrf warm-up GET unless
+    # LeetCode rejects the POST (see the 401/403 branch below).
     headers = {
         "Referer": "https://leetcode.com",
         "Content-Type": "application/json",
         "Accept": "application/json, text/plain, */*",
-        "x-csrftoken": csrftoken,
     }
+    # Accept-Encoding is left to requests/urllib3: with the brotli package
+    # installed they advertise "br" alongside gzip and decode it transparently.
+
+    def post_query() -> "requests.Response":
+        return session.post(
+            GRAPHQL_URL,
+            data=_QUERY_BODY,
+            headers=headers,
+            timeout=REQUEST_TIMEOUT,
+            stream=True,
+        )
+
+    # Retries/backoff for transient errors are handled by the session's adapter.
+    try:
+        resp = post_query()
+        if resp.status_code in (401, 403):
+            logging.info("GraphQL returned %d; retrying with csrftoken.", resp.status_code)
+            try:
+                _read_capped(resp)  # drain the error body so the connection returns to the pool
+            except RuntimeError:
+                pass  # oversized (e.g. a CDN challenge page): already closed, just drop it
+            headers["x-csrftoken"] = _fetch_csrftoken(session)
+            resp = post_query()
+        body = _read_capped(resp)
+        j = orjson.loads(body)
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch LeetCode daily challenge: {e}") from e
+
+    data = (j.get("data") or {}).get("activeDailyCodingChallengeQuestion") if isinstance(j, dict) else None
+    if not data:
+        raise RuntimeError(f"LeetCode response did not contain the daily challenge (HTTP {resp.status_code}).")
+
+    q = data["question"]
+    today = {
+        "id": str(q.get("frontendQuestionId", "")),
+        "title": q.get("title", ""),
+        "difficulty": q.get("difficulty", ""),
+        "content": q.get("content", ""),
+        "link": "https://leetcode.com" + data.get("link", ""),
+        "date": data.get("date", ""),
+    }
+    store_cached_daily(today)
+    return today
 
-    for attempt in range(1, RETRY_ATTEMPTS + 1):
+def prewarm_connection(session: "requests.Session", url: str) -> threading.Thread:
+    """
+    Open a keep-alive connection to url's host in a background thread (DNS + TCP +
+    TLS), so later requests on the same session pick it up warm from the pool.
+    """
+    def _warm() -> None:
         try:
-            resp = session.post(
-                GRAPHQL_URL,
-                json={"query": QUERY},
-                headers=headers,
-                timeout=REQUEST_TIMEOUT,
-            )
-            j = resp.json()
+            # HEAD has no body, so the connection goes straight back to the pool
+            session.head(url, timeout=REQUEST_TIMEOUT, allow_redirects=False)
         except Exception as e:
-            logging.warning("GraphQL attempt %d failed: %s", attempt, e)
-            time.sleep(RETRY_DELAY)
-            continue
+            logging.warning("Connection warm-up for %s failed: %s", url, e)
 
-        if "data" in j and j["data"].get("activeDailyCodingChallengeQuestion"):
-            data = j["data"]["activeDailyCodingChallengeQuestion"]
-            q = data["question"]
-            return {
-                "id": str(q.get("frontendQuestionId", "")),
-                "title": q.get("title", ""),
-                "difficulty": q.get("difficulty", ""),
-                "content": q.get("content", ""),
-                "link": "https://leetcode.com" + data.get("link", ""),
-                "date": data.get("date", ""),
-            }
-
-    raise RuntimeError("Failed to fetch LeetCode daily challenge after retries.")
+    t = threading.Thread(target=_warm, daemon=True)
+    t.start()
+    return t
 
 def build_message(today: Dict[str, Any]) -> str:
-    snippet = clean_html(today.get("content", ""))
+    return _render_message(
+        today.get("date"),
+        today.get("id"),
+        today.get("title", ""),
+        today.get("difficulty", ""),
+        today.get("link"),
+        today.get("content", ""),
+    )
+
+# Memoized on the (hashable) fields of `today`, so repeated triggers for the
+# same daily problem in a long-running process skip HTML cleanup entirely.
+@lru_cache(maxsize=2)
+def _render_message(
+    date: Optional[str], qid: Optional[str], title: str, difficulty: str, link: Optional[str], content: str
+) -> str:
+    snippet = clean_html(content)
     msg = (
-        f"🔥 <b>LeetCode Daily Challenge</b> ({today.get('date')})\n\n"
-        f"📘 <b>{html.escape(today.get('title', ''))}</b>\n"
-        f"🏷️ Difficulty: <code>{html.escape(today.get('difficulty', ''))}</code>\n\n"
-        f"🔗 <a href='{today.get('link')}'>Solve Problem</a>\n\n"
+        f"🔥 <b>LeetCode Daily Challenge</b> ({date})\n\n"
+        f"📘 <b>{html.escape(title)}</b>\n"
+        f"🏷️ Difficulty: <code>{html.escape(difficulty)}</code>\n\n"
+        f"🔗 <a href='{link}'>Solve Problem</a>\n\n"
         f"<i>{snippet}</i>"
     )
     return msg
@@ -188,20 +400,42 @@ def main():
         logging.error("Exiting because TELEGRAM_RECIPIENTS is not configured.")
         sys.exit(1)
 
+    # --force (or LEETCODE_NOCACHE=1) bypasses the on-disk cache
+    force = "--force" in sys.argv[1:] or NO_CACHE
+
+    session = get_session()
+    # Handshake with api.telegram.org while LeetCode is being fetched
+    warm_thread = prewarm_connection(session, "https://api.telegram.org")
+
     logging.info("Fetching today's LeetCode challenge...")
-    today = fetch_daily()
+    today = fetch_daily(session, use_cache=not force)
 
     message = build_message(today)
+    payload_prefix = encode_message_payload(message)
+    warm_thread.join(REQUEST_TIMEOUT)
 
-    errors = []
+    # Group chats by bot so each bot's sends run serially on one worker and reuse
+    # its keep-alive connection instead of racing for fresh ones.
+    grouped: Dict[str, List[str]] = {}
     for bot_token, chat_id in RECIPIENTS:
-        logging.info("Sending to chat_id=%s (bot token head=%s)", chat_id, bot_token[:8] if bot_token else "?")
-        result = send_telegram_single(bot_token, chat_id, message)
-        if not result.get("ok"):
-            errors.append({"bot_token_head": bot_token[:8], "chat_id": chat_id, "response": result})
-            logging.error("Telegram API error for chat_id=%s: %s", chat_id, result)
-        else:
-            logging.info("Message sent to chat_id=%s (message_id=%s).", chat_id, result.get("result", {}).get("message_id"))
+        grouped.setdefault(bot_token, []).append(chat_id)
+
+    errors = []
+    # Send to all bots concurrently and report each bot's results as soon as they land.
+    with ThreadPoolExecutor(max_workers=min(SEND_WORKERS, len(grouped))) as ex:
+        futures = {}
+        for bot_token, chat_ids in grouped.items():
+            logging.info("Sending to chat_ids=%s (bot token head=%s)", chat_ids, bot_token[:8] if bot_token else "?")
+            futures[ex.submit(send_telegram_many, bot_token, chat_ids, payload_prefix, session)] = bot_token
+
+        for future in as_completed(futures):
+            bot_token = futures[future]
+            for chat_id, result in future.result():
+                if not result.get("ok"):
+                    errors.append({"bot_token_head": bot_token[:8], "chat_id": chat_id, "response": result})
+                    logging.error("Telegram API error for chat_id=%s: %s", chat_id, result)
+                else:
+                    logging.info("Message sent to chat_id=%s (message_id=%s).", chat_id, result.get("result", {}).get("message_id"))
 
     if errors:
         logging.error("Some sends failed. See logs above for details.")